@@ -1,8 +1,8 @@
 import os
 import re
-import docx
 
-from RBA_to_ASReview import create_csv_path, pubmed2csv
+from RBA_to_ASReview import create_csv_path, pubmed2csv, setup_logging
+from reference_store import create_db_path, export_csv
 
 def getDRDs():
     directory = os.path.join(os.getcwd(), "DRDs")
@@ -21,6 +21,8 @@ def remove_numbered_prefix(text):
     return re.sub(pattern, '', text)
 
 def extract_references_from_DRD(doc_path):
+    import docx
+
     # Load the document
     doc = docx.Document(doc_path)
     
@@ -57,23 +59,33 @@ def extract_title(reference):
         return match.group(1)
     return None
 
+def process_DRD(drd_path):
+    csv_path = create_csv_path(drd_path)
+    db_path = create_db_path(csv_path)
+
+    # Collect the references from the DRD file
+    references_list = extract_references_from_DRD(drd_path)
+    # Remove duplicates
+    references_list = list(set(references_list))
+    # Extract just the title
+    references_list_titles = [extract_title(x) for x in references_list]
+    # Turn into list of dicts with ref['title']
+    references_list_titles = [{'p_title': x} for x in references_list_titles]
+    # Call pubmed2csv and get proper reference format from PubMed
+    pubmed2csv(references_list_titles, csv_path, db_path=db_path)
+    # Write the ASReview csv from the reference store
+    export_csv(db_path, csv_path)
+
 if __name__ == "__main__":
+    setup_logging()
+
     drd_files = getDRDs()
 
     for i, drd_path in enumerate(drd_files):
         print(f"Processing DRD #{i+1}...")
-
-        csv_path = create_csv_path(drd_path)
-
-        # Collect the references from the DRD file
-        references_list = extract_references_from_DRD(drd_path)
-        # Remove duplicates
-        references_list = list(set(references_list))
-        # Extract just the title
-        references_list_titles = [extract_title(x) for x in references_list]
-        # Turn into list of dicts with ref['title']
-        references_list_titles = [{'p_title': x} for x in references_list_titles]
-        # Call pubmed2csv and get proper reference format from PubMed
-        pubmed2csv(references_list_titles, csv_path, max_hash_distance=12)
+        try:
+            process_DRD(drd_path)
+        except Exception as err:
+            print(f"!! Could not process '{drd_path}', please run the tool again later: {err}")
 
     input("Press Enter to exit...")
@@ -1,4 +1,3 @@
-import requests
 import xml.etree.ElementTree as ET
 import os
 from string import punctuation
@@ -7,12 +6,31 @@ import csv
 import logging
 import hashlib
 from functools import reduce
-from docx import Document
+from contextlib import closing
 
-logging.basicConfig(filename='logs/paper-kinderformularium.log',
-                    format='%(asctime)s|%(levelname)-8s|%(message)s',
-                    level=logging.INFO,
-                    datefmt='%Y-%m-%d %H:%M:%S')
+# python-docx and requests are imported inside the functions that use them,
+# so that importing a couple of helpers from this module stays cheap.
+
+session = None
+
+def get_session():
+    """Returns a shared requests session, so PubMed connections are reused between calls"""
+    global session
+    if session is None:
+        import requests
+
+        session = requests.Session()
+    return session
+
+def setup_logging():
+    """Configures the log file, called from the entry points rather than on import"""
+    if not os.path.exists('logs'):
+        os.makedirs('logs')
+
+    logging.basicConfig(filename='logs/paper-kinderformularium.log',
+                        format='%(asctime)s|%(levelname)-8s|%(message)s',
+                        level=logging.INFO,
+                        datefmt='%Y-%m-%d %H:%M:%S')
 
 def hash_shingle(shingle):
     """Hash a shingle to an integer using SHA-1."""
@@ -55,7 +73,7 @@ def search_API(query):
         "retmax": '20',
         "retmode": 'xml'
     }
-    response = requests.get(url, params=params)
+    response = get_session().get(url, params=params)
     
     root = ET.fromstring(response.text)
     ids = [id_elem.text for id_elem in root.findall(".//Id")]
@@ -78,7 +96,7 @@ def fetch_details(id_list):
         "id": ",".join(id_list),
         "retmode": 'xml'
     }
-    response = requests.get(url, params=params)
+    response = get_session().get(url, params=params)
 
     root = ET.fromstring(response.text)
     articles = []
@@ -137,6 +155,8 @@ def collectFromEndnote(rba_path):
         Contains the extracted DOI, authors, and title
         for each reference as an object.
     """
+    from docx import Document
+
     doc = Document(rba_path) # create an instance of a word document we want to open
 
     findBegin = False
@@ -192,6 +212,73 @@ def collectFromEndnote(rba_path):
             references_list.append(search_item)
     return references_list
 
+def iter_unique_cells(table):
+    """Yields every cell of a table exactly once
+
+    python-docx returns a merged cell once for every grid column and row it
+    spans. Walking the underlying w:tc elements instead gives each cell once:
+    a horizontally merged cell is a single w:tc, and the w:tc elements that
+    continue a vertical merge are skipped.
+
+    Parameters
+    ----------
+    table : docx.table.Table
+
+    Returns
+    -------
+    tc : generator of w:tc elements
+    """
+    for tr in table._tbl.tr_lst:
+        for tc in tr.tc_lst:
+            if tc.vMerge == 'continue':
+                continue
+            yield tc
+
+def starts_with_bold_run(tc):
+    """Checks if the first run of the first paragraph of a cell is bold,
+    without creating paragraph and run objects for the whole cell
+
+    Parameters
+    ----------
+    tc : w:tc element
+
+    Returns
+    -------
+    bold : boolean
+    """
+    if len(tc.p_lst) == 0:
+        return False
+
+    r_lst = tc.p_lst[0].r_lst
+    if len(r_lst) == 0:
+        return False
+
+    rPr = r_lst[0].rPr
+    return rPr is not None and rPr.b is not None and rPr.b.val
+
+def iter_summary_cells(table):
+    """Yields the unique cells of a table that start with a bold run
+    and mention "samenvatting" or "summary"
+
+    Parameters
+    ----------
+    table : docx.table.Table
+
+    Returns
+    -------
+    cell : generator of docx.table._Cell
+    """
+    from docx.table import _Cell
+
+    for tc in iter_unique_cells(table):
+        if not starts_with_bold_run(tc):
+            continue
+
+        cell = _Cell(tc, table)
+        text = cell.text.lower()
+        if 'samenvatting' in text or 'summary' in text:
+            yield cell
+
 def collectFromTables(rba_path):
     """Extracts the reference list from a file with a table
 
@@ -205,82 +292,69 @@ def collectFromTables(rba_path):
     references_list : list of dictionaries
         Contains the extracted authors and title for each reference as an object
     """
+    from docx import Document
+
     doc = Document(rba_path)
 
-    data = []
     references_list = []
     for table in doc.tables:
 
-        if len(table.rows) == 0:
-            continue
-
-        for i, row in enumerate(table.rows):
-
-            if len(row.cells) == 0:
-                continue
+        for cell in iter_summary_cells(table):
 
-            for j, cell in enumerate(row.cells):
+            bold_text = ''
+            p_title = ''
+            p_authors = ''
 
-                if (len(cell.paragraphs) > 0
-                    and len(cell.paragraphs[0].runs) > 0
-                    and cell.paragraphs[0].runs[0].bold
-                    and ('samenvatting' in cell.text.lower()
-                         or 'summary' in cell.text.lower())):
+            for p, paragraph in enumerate(cell.paragraphs):
 
-                    bold_text = ''
-                    p_title = ''
-                    p_authors = ''
-
-                    for p, paragraph in enumerate(cell.paragraphs):
+                if len(paragraph.runs) < 1:
+                    continue
 
-                        if len(paragraph.runs) < 1:
-                            continue
+                if (p == 0
+                    and paragraph.runs[0].bold
+                    and not paragraph.runs[-1].bold):
 
-                        if (p == 0
-                            and paragraph.runs[0].bold
-                            and not paragraph.runs[-1].bold):
+                    for r, run in enumerate(paragraph.runs):
 
-                            for r, run in enumerate(paragraph.runs):
+                        if run.bold:
+                            bold_text += run.text.strip() + ' '
 
-                                if run.bold:
-                                    bold_text += run.text.strip() + ' '
+                        else:
+                            p_title = bold_text
 
-                                else:
-                                    p_title = bold_text
+                        if p_title and not run.bold and run.text != ' ':
 
-                                if p_title and not run.bold and run.text != ' ':
+                            p_authors += run.text.strip() + ' '
 
-                                    p_authors += run.text.strip() + ' '
+                elif (paragraph.runs[0].bold
+                      and paragraph.runs[-1].bold and p_title == ''):
 
-                        elif (paragraph.runs[0].bold
-                              and paragraph.runs[-1].bold and p_title == ''):
+                    bold_text += paragraph.text.strip() + ' '
 
-                            bold_text += paragraph.text.strip() + ' '
+                elif (not paragraph.runs[-1].bold
+                      and p > 0
+                      and len(cell.paragraphs[p-1].runs) > 0
+                      and cell.paragraphs[p-1].runs[-1].bold):
 
-                        elif (not paragraph.runs[-1].bold
-                              and p > 0
-                              and len(cell.paragraphs[p-1].runs) > 0
-                              and cell.paragraphs[p-1].runs[-1].bold):
+                    p_title = bold_text
 
-                            p_title = bold_text
+                    p_authors += paragraph.text.strip() + ' '
 
-                            p_authors += paragraph.text.strip() + ' '
+                elif (paragraph.runs[0].underline
+                      and (paragraph.runs[0].text.lower().startswith('samenvatting')
+                           or paragraph.runs[0].text.lower().startswith('summary'))):
+                    break
 
-                        elif (paragraph.runs[0].underline
-                              and (paragraph.runs[0].text.lower().startswith('samenvatting')
-                                   or paragraph.runs[0].text.lower().startswith('summary'))):
-                            break
-
-                    if p_title.strip() != ''  and re.search(r'^[0-9].[0-9]', p_title) is None:
-                        references_list.append({
-                            'p_title': p_title.replace('\xa0',' ').replace('\n', '').strip(),
-                            'p_authors': p_authors.replace('\xa0',' ').replace('\n', '').strip(),
-                        })
+            if p_title.strip() != ''  and re.search(r'^[0-9].[0-9]', p_title) is None:
+                references_list.append({
+                    'p_title': p_title.replace('\xa0',' ').replace('\n', '').strip(),
+                    'p_authors': p_authors.replace('\xa0',' ').replace('\n', '').strip(),
+                })
 
     return references_list
 
-def pubmed2csv(references_list, csv_path):
-    """Creates a csv file consists of the references
+def search_references(references_list, csv_path, pmids, store=None):
+    """Looks up the references in PubMed and adds the ones that are not there yet
 
     Parameters
     ----------
@@ -290,32 +364,21 @@ def pubmed2csv(references_list, csv_path):
     csv_path : string
         corresponding csv path for the file
 
-    Returns
-    -------
-    Creates a csv file on the given CSV path
-    """
-    logging.info('PROCESSING THE FILE: {}'.format(csv_path))
-
-    # print to console
-    print(f"Processing {len(references_list)} references...")
-
-    if not os.path.exists(csv_path):
-        pmids = []
-        header = ['pubmed_id', 'title', 'abstract', 'doi', 'final_included']
-        with open(csv_path, 'w', newline='', encoding='ISO-8859-15', errors='ignore') as csvfile:
-            cw = csv.writer(csvfile, delimiter=',')
-            cw.writerow(header)
+    pmids : set of strings, or StorePMIDs
+        PubMed ids already in the output, found references are added to it
 
-    elif os.path.exists(csv_path):
-        with open(csv_path, 'r', newline='', encoding='ISO-8859-15', errors='ignore') as csvfile:
-            cw = csv.reader(csvfile)
-            header = next(cw)
+    store : sqlite3.Connection
+        Optional reference store to add the references to instead of the csv file
 
-            rows = []
-            for row in cw:
-                rows.append(row)
+    Raises
+    ------
+    requests.ConnectionError, requests.Timeout
+        When PubMed cannot be reached, since the remaining references would fail too
+    """
+    import requests
 
-        pmids = [l[0] for l in rows]
+    if store is not None:
+        from reference_store import add_reference
 
     #Loop over the reference list
     ref_num = 0
@@ -359,35 +422,101 @@ def pubmed2csv(references_list, csv_path):
                 paperTitle = paper['title']
                 jaccard_score = jaccard_similarity(paperTitle.strip(punctuation), ref['p_title'].strip(punctuation))
                 if (jaccard_score >= 0.9):
-                    if ((id_list[paperIndex] not in pmids) or pmids == []):
+                    if id_list[paperIndex] not in pmids:
                         data = [id_list[paperIndex], paperTitle, paper['abstract'], paper['doi'], 1]
-                        with open(csv_path, 'a', newline='', encoding='ISO-8859-15', errors='ignore') as csvfile:
-                            cw = csv.writer(csvfile, delimiter=',')
-                            cw.writerow(data)
+                        if store is not None:
+                            add_reference(store, data, ref['p_title'], search_query, jaccard_score)
+                        else:
+                            with open(csv_path, 'a', newline='', encoding='ISO-8859-15', errors='ignore') as csvfile:
+                                cw = csv.writer(csvfile, delimiter=',')
+                                cw.writerow(data)
+                        pmids.add(id_list[paperIndex])
                         referenceFound = True
-                        pmids.append(id_list[paperIndex])
                         break
-                    elif (id_list[paperIndex] in pmids):
+                    else:
                         logging.debug('The reference "{}" is already in the csv file, therefore skipped.'.format(ref['p_title']))
                         referenceFound = True
                         break
             if (not referenceFound) and (id_list[paperIndex] not in pmids):
                 logging.error('!!!!! The reference could not be retrieved from the PubMed database. Search query was: "{}". Paper title was: "{}"'.format(search_query, ref['p_title']))
+        except (requests.ConnectionError, requests.Timeout) as err:
+            logging.error('!!! PubMed could not be reached, stopped at the title "{}". Error message: {}'.format(ref['p_title'], err))
+            raise
         except Exception as err:
             logging.error('!!! The reference could not be found automaticaly for the title "{}". Error message: {}'.format(ref['p_title'], err))
 
+def pubmed2csv(references_list, csv_path, db_path=None):
+    """Creates a csv file consists of the references
+
+    Parameters
+    ----------
+    references_list : list of dictionaries
+        Contains dictionaries with paper DOIs, authors and titles
+
+    csv_path : string
+        corresponding csv path for the file
+
+    db_path : string
+        Optional path of a SQLite reference store (see reference_store.py).
+        If given, references are stored there losslessly instead of being
+        appended to the csv file, which can be exported with export_csv.
+
+    Returns
+    -------
+    Creates a csv file on the given CSV path, or adds to the reference store
+    """
+    logging.info('PROCESSING THE FILE: {}'.format(csv_path))
+
+    # print to console
+    print(f"Processing {len(references_list)} references...")
+
+    if db_path is not None:
+        from reference_store import open_store, StorePMIDs
+
+        with closing(open_store(db_path, csv_path)) as store:
+            search_references(references_list, csv_path, StorePMIDs(store), store)
+        return
+
+    if not os.path.exists(csv_path):
+        pmids = set()
+        header = ['pubmed_id', 'title', 'abstract', 'doi', 'final_included']
+        with open(csv_path, 'w', newline='', encoding='ISO-8859-15', errors='ignore') as csvfile:
+            cw = csv.writer(csvfile, delimiter=',')
+            cw.writerow(header)
+
+    elif os.path.exists(csv_path):
+        with open(csv_path, 'r', newline='', encoding='ISO-8859-15', errors='ignore') as csvfile:
+            cw = csv.reader(csvfile)
+            header = next(cw)
+
+            rows = []
+            for row in cw:
+                rows.append(row)
+
+        pmids = {l[0] for l in rows}
+
+    search_references(references_list, csv_path, pmids)
+
 if __name__ == "__main__":
+    from reference_store import create_db_path, export_csv
+
+    setup_logging()
+
     rba_path = os.path.abspath('docs/3b. Risicoanalyse kinderformularium clonazepam epilepsie.docx')
     csv_path = create_csv_path(rba_path)
+    db_path = create_db_path(csv_path)
 
     # Collect the Endnote references from the RBA file
     references_list_endnote = collectFromEndnote(rba_path)
 
     # Write the extracted references to the output file
-    pubmed2csv(references_list_endnote, csv_path)
+    pubmed2csv(references_list_endnote, csv_path, db_path=db_path)
 
     # Collect the table references from the RBA file
     references_list_table = collectFromTables(rba_path)
 
     # Write the extracted references to the output file
-    pubmed2csv(references_list_table, csv_path)
+    pubmed2csv(references_list_table, csv_path, db_path=db_path)
+
+    # Write the ASReview csv from the reference store
+    export_csv(db_path, csv_path)
@@ -0,0 +1,59 @@
+import subprocess
+import sys
+import time
+
+# Modules whose import time matters for the double-clicked executables
+modules = ['RBA_to_ASReview', 'DRD_to_ASReview', 'process_asreview_output']
+
+# Heavy dependencies that should not be loaded by a plain import anymore
+heavy = ['docx', 'requests', 'asreview', 'langdetect', 'bs4', 'openpyxl']
+
+
+def time_import(module, runs=5):
+    """Measures the cold import time of a module in a fresh interpreter
+
+    Parameters
+    ----------
+    module : string
+        Name of the module to import
+
+    runs : integer
+        Number of fresh interpreters to start, the fastest one is reported
+
+    Returns
+    -------
+    best : float
+        Fastest import time in seconds
+
+    loaded : list of strings
+        Heavy dependencies that were loaded by the import
+    """
+    code = (f"import sys, time; t = time.perf_counter(); import {module}; "
+            f"print(time.perf_counter() - t); "
+            f"print(','.join(m for m in {heavy!r} if m in sys.modules))")
+
+    best = None
+    loaded = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"Could not import {module}: {result.stderr.strip().splitlines()[-1]}")
+            return None, []
+
+        elapsed, loaded = result.stdout.splitlines()
+        elapsed = float(elapsed)
+        loaded = [m for m in loaded.split(',') if m]
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best, loaded
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    for module in modules:
+        best, loaded = time_import(module)
+        if best is None:
+            continue
+        print(f"{module:<25} {best * 1000:8.1f} ms   heavy imports: {', '.join(loaded) or '-'}")
+    print(f"Total benchmark time: {time.perf_counter() - start:.1f} s")
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import time
+
+from docx import Document
+
+from RBA_to_ASReview import collectFromTables, iter_summary_cells
+
+
+def create_merged_table_docx(path, n_rows=60, n_cols=12):
+    """Creates a .docx file with a wide table in which every reference
+    is a bold "summary" cell merged across the full width and two rows
+
+    Parameters
+    ----------
+    path : string
+        Path the .docx file is saved to
+
+    n_rows : integer
+        Number of table rows, every two rows hold one reference
+
+    n_cols : integer
+        Number of grid columns each reference cell spans
+    """
+    doc = Document()
+    table = doc.add_table(rows=n_rows, cols=n_cols)
+
+    for i in range(0, n_rows - 1, 2):
+        cell = table.cell(i, 0).merge(table.cell(i + 1, n_cols - 1))
+        paragraph = cell.paragraphs[0]
+        paragraph.add_run(f'Pharmacokinetics of clonazepam in children, study {i // 2}').bold = True
+        paragraph.add_run(f' Author {i // 2} et al.')
+        cell.add_paragraph().add_run('Samenvatting').underline = True
+        cell.add_paragraph('Summary of the study results.')
+
+    doc.save(path)
+
+
+def count_cells_python_docx(doc):
+    # The previous traversal: every merged cell is visited once per grid cell it spans
+    count = 0
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                if (len(cell.paragraphs) > 0
+                    and len(cell.paragraphs[0].runs) > 0
+                    and cell.paragraphs[0].runs[0].bold
+                    and ('samenvatting' in cell.text.lower()
+                         or 'summary' in cell.text.lower())):
+                    count += 1
+    return count
+
+
+def count_cells_unique(doc):
+    return sum(1 for table in doc.tables for _ in iter_summary_cells(table))
+
+
+def best_time(fn, *args, runs=5):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_rows, n_cols in [(20, 4), (60, 12), (200, 24)]:
+            path = os.path.join(tmp_dir, f'merged_{n_rows}x{n_cols}.docx')
+            create_merged_table_docx(path, n_rows, n_cols)
+            doc = Document(path)
+
+            old_time, old_count = best_time(count_cells_python_docx, doc)
+            new_time, new_count = best_time(count_cells_unique, doc)
+            _, references = best_time(collectFromTables, path, runs=1)
+
+            print(f"{n_rows:>4} rows x {n_cols:>2} cols: "
+                  f"row.cells {old_time * 1000:8.1f} ms ({old_count} summary cells), "
+                  f"w:tc walk {new_time * 1000:8.1f} ms ({new_count} summary cells), "
+                  f"{len(references)} references")
@@ -1,5 +1,11 @@
 
 
+#Evidence definitions
+definitions = {"A1": ["meta-analysis", "meta analysis", "systematic-review", "systematic review"],
+            "A2": ["randomized", "controlled", "double-blind", "double blind", " rct ", " rcts ", "placebo-controlled", "placebo controlled"],
+            "B": ["comparative", "observational", "retrospective", "prospective"],
+            "C": ["case report", "case-report", "case-series", "case series"]}
+
 def check_if_not_exists(term, row):
     if (f"not {term}" in str(row["title"]).lower() or 
         f"not {term}" in str(row["abstract"]).lower()):
@@ -13,12 +19,6 @@ def insert_evidence(df):
     df["evidence"] = ""
     df["keyword for evidence"] = ""
 
-    #Evidence definitions
-    definitions = {"A1": ["meta-analysis", "meta analysis", "systematic-review", "systematic review"],
-                "A2": ["randomized", "controlled", "double-blind", "double blind", " rct ", " rcts ", "placebo-controlled", "placebo controlled"],
-                "B": ["comparative", "observational", "retrospective", "prospective"],
-                "C": ["case report", "case-report", "case-series", "case series"]}
-
     #Loop through rows and definitions
     for index, row in df.iterrows():
         for key, value in definitions.items():
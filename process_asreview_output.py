@@ -1,22 +1,37 @@
 import pandas as pd
-import requests
 import os
 
-from bs4 import BeautifulSoup
-from openpyxl import load_workbook
-from asreview import open_state
-from langdetect import detect
+from evidence import insert_evidence, definitions
+from pk import process_pk, keywords
+from record_cache import (CACHE_VERSION, tables_hash, load_cache, save_cache, workbook_fingerprint, is_up_to_date,
+                          record_hash, find_new_records, store_results, apply_results, prune_records)
 
-from evidence import insert_evidence
-from pk import process_pk
+# asreview, langdetect, requests/bs4 and openpyxl are slow to import, so they
+# are only imported inside the stage that needs them.
 
-config = {}
-with open('config.txt', 'r') as config_f:
-    for line in config_f:
-        if '=' not in line:
-            continue
-        key, value = line.split('=', 1)
-        config[key.strip()] = value.strip()
+session = None
+
+
+def get_session():
+    # Shared requests session, so WorldCat connections are reused between articles
+    global session
+    if session is None:
+        import requests
+
+        session = requests.Session()
+    return session
+
+
+def read_config(config_path='config.txt'):
+    config = {}
+    with open(config_path, 'r') as config_f:
+        for line in config_f:
+            if '=' not in line:
+                continue
+            key, value = line.split('=', 1)
+            config[key.strip()] = value.strip()
+
+    return config
 
 
 def get_excels():
@@ -32,15 +47,25 @@ def get_excels():
     return xlsx_files
 
 
-def asreview_file_exists(output_file):
+def get_asreview_path(output_file):
     # Get filename
     filename, _ = os.path.splitext(os.path.basename(output_file))
 
+    return f'ASReviewFiles/{filename}.asreview'
+
+
+def get_processed_path(file):
+    return f'{file.split(".")[0]}_processed.xlsx'
+
+
+def asreview_file_exists(output_file):
     # Check if .asreview file exists with same name
-    return os.path.exists(f'ASReviewFiles/{filename}.asreview')
+    return os.path.exists(get_asreview_path(output_file))
 
 
 def exclude_languages(df):
+    from langdetect import detect
+
     print("Excluding non-English, non-Dutch and non-German articles...")
 
     langdetect_allowed = ['en', 'de', 'nl']
@@ -74,13 +99,15 @@ def process_doi(df):
 
 
 def check_full_text_availability(pubmed_id, worldcat_url):
+    from bs4 import BeautifulSoup
+
     print(f"-Fetching online availability of article with PubMed code: {pubmed_id}")
-    response = requests.get(worldcat_url + str(pubmed_id))
+    response = get_session().get(worldcat_url + str(pubmed_id))
 
     # Check if the request was successful
     if response.status_code != 200:
         print(f"--Failed to retrieve the page. Status code: {response.status_code}")
-        return 0
+        return None
     
     # Parse the response content
     soup = BeautifulSoup(response.content, 'html.parser')
@@ -102,9 +129,13 @@ def check_full_text_availability(pubmed_id, worldcat_url):
             return -1
 
 
-def ensure_full_texts_only(df):
+def full_text_check_enabled(config):
+    return config.get('only_full_texts', 0) == 'true' and 'institution_worldcat_url' in config
+
+
+def ensure_full_texts_only(df, config):
     # First check if it is turned on in config
-    if config.get('only_full_texts', 0) == 'true' and 'institution_worldcat_url' in config:
+    if full_text_check_enabled(config):
         print("Checking for full-text capabilities...")
         worldcat_url = f'{config["institution_worldcat_url"]}/atoztitles/link?id=pmid:'
     else:
@@ -113,7 +144,10 @@ def ensure_full_texts_only(df):
     dubious_rows = []
     for row in df.itertuples():
         has_full_text = check_full_text_availability(row.accession_number, worldcat_url)
-        if has_full_text != 1:
+        # Keep failed checks apart, so they are not cached (they are written as 0)
+        if has_full_text is None:
+            dubious_rows.append(None)
+        elif has_full_text != 1:
             dubious_rows.append(0)
         else:
             dubious_rows.append(1)
@@ -125,10 +159,11 @@ def ensure_full_texts_only(df):
 
 
 def add_info_from_asreview_file(file, df):
+    from asreview import open_state
+
     print("Extracting labeling time and notes info from the .asreview file...")
-    asreview_file, _ = os.path.splitext(os.path.basename(file))
 
-    with open_state(f'ASReviewFiles/{asreview_file}.asreview') as state:
+    with open_state(get_asreview_path(file)) as state:
         asreview_df = state.get_dataset()
 
     # Select relevant columns and set index
@@ -149,6 +184,8 @@ def add_info_from_asreview_file(file, df):
 
 
 def apply_hyperlinks(processed_file, df):
+    from openpyxl import load_workbook
+
     print("Applying hyperlinks...")
     workbook = load_workbook(processed_file)
     worksheet = workbook.active
@@ -170,7 +207,75 @@ def apply_hyperlinks(processed_file, df):
     workbook.save(processed_file)
 
 
+def process_records(df, config, records):
+    # Only records that are new or changed since the last run go through the per-record stages,
+    # the results of all other records are taken from the cache
+    hashes = df.apply(record_hash, axis=1)
+    df_new = df[find_new_records(df, hashes, records)]
+    print(f"{len(df) - len(df_new)} records unchanged since the last run, processing {len(df_new)} records...")
+
+    if len(df_new) > 0:
+        # Eclude non-English, non-Dutch and non-German papers
+        df_processed = exclude_languages(df_new)
+
+        if len(df_processed) > 0:
+            # Ensure full-text capabilities of user
+            df_processed = ensure_full_texts_only(df_processed, config)
+
+            # Check levels of evidence
+            df_processed = insert_evidence(df_processed)
+
+            # Check PK-ness of study
+            df_processed = process_pk(df_processed)
+
+        store_results(records, df_new, df_processed, hashes)
+
+    prune_records(df, records)
+
+    return apply_results(df, records, full_text_check_enabled(config))
+
+
+def get_cache_settings(config):
+    # The config settings and keyword tables the cached record results depend on
+    settings = {key: config.get(key) for key in ['only_full_texts', 'institution_worldcat_url']}
+    settings['version'] = CACHE_VERSION
+    settings['keywords'] = tables_hash(definitions, keywords)
+    return settings
+
+
+def process_excel_file(file, config, cache):
+    processed_file = get_processed_path(file)
+    asreview_path = get_asreview_path(file)
+
+    # Skip workbooks that did not change since their processed file was written
+    if is_up_to_date(cache, workbook_fingerprint(file, asreview_path, processed_file)):
+        print(f"Skipping '{file}', nothing changed since it was last processed.")
+        return
+
+    df = pd.read_excel(file, header=0)
+
+    # Exclude languages, check full-text, evidence and PK of new or changed records
+    df = process_records(df, config, cache['records'])
+
+    # Set DOI urls
+    df = process_doi(df)
+
+    # Add labeling time and notes
+    df = add_info_from_asreview_file(file, df)
+
+    # Write to excel
+    df.to_excel(processed_file, index=False)
+
+    # Turn DOI into hyperlinks
+    apply_hyperlinks(processed_file, df)
+
+    # Remember the state of the files, so an unchanged workbook is skipped next time
+    cache['fingerprint'] = workbook_fingerprint(file, asreview_path, processed_file)
+    save_cache(file, cache)
+
+
 def process_asreview_output():
+    config = read_config()
     excel_files = get_excels()
 
     # Cycle through each file
@@ -181,33 +286,7 @@ def process_asreview_output():
                   f"for file '{file}'. Make sure it has the exact same name!")
             continue
 
-        df = pd.read_excel(file, header=0)
-
-        # Eclude non-English, non-Dutch and non-German papers
-        df = exclude_languages(df)
-
-        # Ensure full-text capabilities of user
-        df = ensure_full_texts_only(df)
-
-        # Set DOI urls
-        df = process_doi(df)
-
-        # Check levels of evidence
-        df = insert_evidence(df)
-
-        # Check PK-ness of study
-        df = process_pk(df)
-
-        # Add labeling time and notes
-        df = add_info_from_asreview_file(file, df)
-
-        # Write to excel
-        processed_file = f'{file.split(".")[0]}_processed.xlsx'
-        df.to_excel(processed_file, index=False)
-
-        # Turn DOI into hyperlinks
-        apply_hyperlinks(processed_file, df)
-        
+        process_excel_file(file, config, load_cache(file, get_cache_settings(config)))
 
 
 def main():
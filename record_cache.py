@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+CACHE_DIR = 'cache'
+
+# Increase when the per-record stages change in a way the keyword tables do not show
+# (e.g. the allowed languages or the negation rules), so cached results are recomputed
+CACHE_VERSION = 1
+
+# Columns added by the per-record stages (language exclusion, full-text check, evidence and PK)
+RESULT_COLUMNS = ['full-text', 'evidence', 'keyword for evidence', 'PK', 'PK_keyword']
+
+# Columns the per-record stages read, a change in any of them means the record is processed again
+HASHED_COLUMNS = ['title', 'abstract', 'language', 'original_publication', 'accession_number']
+
+
+def tables_hash(*tables):
+    # Hash of keyword tables (evidence definitions, PK keywords), editing them invalidates the cache
+    return hashlib.sha1(json.dumps(tables, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def cache_path(file):
+    filename, _ = os.path.splitext(os.path.basename(file))
+    return os.path.join(CACHE_DIR, f'{filename}.json')
+
+
+def load_cache(file, settings):
+    # Results depend on the config (e.g. the full-text check), so a different config starts over
+    cache = {'settings': settings, 'fingerprint': None, 'records': {}}
+
+    path = cache_path(file)
+    if not os.path.exists(path):
+        return cache
+
+    try:
+        with open(path, 'r', encoding='utf-8') as cache_f:
+            stored = json.load(cache_f)
+    except (OSError, ValueError):
+        print(f"Could not read the cache file '{path}', processing all records again.")
+        return cache
+
+    if stored.get('settings') == settings:
+        cache['fingerprint'] = stored.get('fingerprint')
+        cache['records'] = stored.get('records', {})
+
+    return cache
+
+
+def save_cache(file, cache):
+    if not os.path.exists(CACHE_DIR):
+        os.makedirs(CACHE_DIR)
+
+    # Write to a temporary file first so an interrupted run cannot leave a broken cache behind
+    path = cache_path(file)
+    with open(path + '.tmp', 'w', encoding='utf-8') as cache_f:
+        json.dump(cache, cache_f)
+    os.replace(path + '.tmp', path)
+
+
+def file_fingerprint(path):
+    # Size and modification time of a file, or None if it does not exist (anymore)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def workbook_fingerprint(file, asreview_path, processed_file):
+    return {
+        'excel': file_fingerprint(file),
+        'asreview': file_fingerprint(asreview_path),
+        'processed': file_fingerprint(processed_file),
+    }
+
+
+def count_failed_records(cache):
+    # Records stored without a hash, because their full-text check failed
+    return sum(1 for record in cache['records'].values() if record['hash'] is None)
+
+
+def is_up_to_date(cache, fingerprint):
+    # The processed output must still exist, and none of the files may have changed since the last run.
+    # Records whose full-text check failed are checked again, so their workbook is never skipped.
+    return (fingerprint['processed'] is not None
+            and cache['fingerprint'] == fingerprint
+            and count_failed_records(cache) == 0)
+
+
+def record_hash(row):
+    content = '\x1f'.join(str(row[col]) if col in row and pd.notna(row[col]) else ''
+                          for col in HASHED_COLUMNS)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def record_key(row):
+    return str(row['record_id'])
+
+
+def to_json_value(value):
+    if pd.isna(value):
+        return None
+    # Turn numpy scalars into plain python values
+    if hasattr(value, 'item'):
+        value = value.item()
+    # process_pk builds its columns from pd.Series((0, None)), which turns the PK flag into a float
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def find_new_records(df, hashes, records):
+    # Records that were never processed, or whose content changed since they were
+    return [records.get(record_key(row), {}).get('hash') != hashes[index]
+            for index, row in df.iterrows()]
+
+
+def store_results(records, df_new, df_processed, hashes):
+    kept = {record_key(row): row for _, row in df_processed.iterrows()}
+
+    for index, row in df_new.iterrows():
+        key = record_key(row)
+        if key not in kept:
+            records[key] = {'hash': hashes[index], 'excluded': True}
+            continue
+
+        records[key] = {'hash': hashes[index], 'excluded': False}
+        for col in RESULT_COLUMNS:
+            if col in kept[key]:
+                records[key][col] = to_json_value(kept[key][col])
+
+        # A failed full-text check is stored without a hash, so the record is checked again next run
+        if 'full-text' in kept[key] and records[key]['full-text'] is None:
+            records[key]['hash'] = None
+
+
+def apply_results(df, records, with_full_text):
+    result_columns = [col for col in RESULT_COLUMNS if with_full_text or col != 'full-text']
+
+    kept_rows = []
+    results = {col: [] for col in result_columns}
+    for index, row in df.iterrows():
+        record = records[record_key(row)]
+        if record['excluded']:
+            continue
+
+        kept_rows.append(index)
+        for col in result_columns:
+            results[col].append(record.get(col))
+
+        # A failed full-text check is written as 0, like a missing full text
+        if with_full_text and results['full-text'][-1] is None:
+            results['full-text'][-1] = 0
+
+    df = df.loc[kept_rows].reset_index(drop=True)
+    for col in result_columns:
+        df[col] = results[col]
+
+    return df
+
+
+def prune_records(df, records):
+    # Forget records that are no longer in the workbook
+    keys = {record_key(row) for _, row in df.iterrows()}
+    for key in list(records):
+        if key not in keys:
+            del records[key]
@@ -0,0 +1,160 @@
+import csv
+import os
+import sqlite3
+from datetime import datetime
+
+# Columns of the ASReview-compatible csv, in order
+CSV_HEADER = ['pubmed_id', 'title', 'abstract', 'doi', 'final_included']
+
+
+def create_db_path(csv_path):
+    """Creates the path of the reference store that belongs to a csv file
+
+    Parameters
+    ----------
+    csv_path : string
+        Path of the csv file, as created by create_csv_path
+
+    Returns
+    -------
+    db_path : string
+    """
+    return os.path.splitext(csv_path)[0] + '.sqlite'
+
+
+def open_store(db_path, csv_path=None):
+    """Opens (and creates if needed) the reference store of a document
+
+    References are stored losslessly as UTF-8 text, with the PubMed id as
+    primary key so membership checks are index lookups. A new store is filled
+    with the references from an existing csv file, so references found in
+    earlier runs are not added again.
+
+    Parameters
+    ----------
+    db_path : string
+        Path of the SQLite database
+
+    csv_path : string
+        Path of an existing csv file to import into a new store
+
+    Returns
+    -------
+    store : sqlite3.Connection
+    """
+    store = sqlite3.connect(db_path)
+    store.execute("""
+        CREATE TABLE IF NOT EXISTS pubmed_references (
+            pubmed_id TEXT PRIMARY KEY,
+            title TEXT,
+            abstract TEXT,
+            doi TEXT,
+            final_included INTEGER,
+            reference_title TEXT,
+            search_query TEXT,
+            jaccard_score REAL,
+            added_at TEXT
+        )""")
+    store.commit()
+
+    is_empty = store.execute("SELECT 1 FROM pubmed_references LIMIT 1").fetchone() is None
+    if is_empty and csv_path is not None and os.path.exists(csv_path):
+        import_csv(store, csv_path)
+
+    return store
+
+
+def import_csv(store, csv_path):
+    """Adds the references of an existing csv file to the store
+
+    Parameters
+    ----------
+    store : sqlite3.Connection
+
+    csv_path : string
+        Path of a csv file written by pubmed2csv
+    """
+    with open(csv_path, 'r', newline='', encoding='ISO-8859-15', errors='ignore') as csvfile:
+        cr = csv.reader(csvfile)
+        next(cr, None)
+        rows = [row[:len(CSV_HEADER)] for row in cr if len(row) >= len(CSV_HEADER)]
+
+    store.executemany("INSERT OR IGNORE INTO pubmed_references "
+                      "(pubmed_id, title, abstract, doi, final_included) VALUES (?, ?, ?, ?, ?)", rows)
+    store.commit()
+
+
+def store_contains(store, pubmed_id):
+    """Checks if a PubMed id is already in the store, using the primary key index"""
+    return store.execute("SELECT 1 FROM pubmed_references WHERE pubmed_id = ?",
+                         (pubmed_id,)).fetchone() is not None
+
+
+class StorePMIDs:
+    """Set-like view of the PubMed ids in a store
+
+    Membership checks are primary key lookups, so the ids are never all loaded.
+    add does nothing, the reference itself is added with add_reference.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def __contains__(self, pubmed_id):
+        return store_contains(self.store, pubmed_id)
+
+    def add(self, pubmed_id):
+        pass
+
+
+def add_reference(store, data, reference_title=None, search_query=None, jaccard_score=None):
+    """Appends a resolved reference to the store
+
+    Parameters
+    ----------
+    store : sqlite3.Connection
+
+    data : list
+        pubmed_id, title, abstract, doi and final_included, as in the csv file
+
+    reference_title : string
+        Title as extracted from the document
+
+    search_query : string
+        Query that returned the paper from PubMed
+
+    jaccard_score : float
+        Similarity between the extracted and the PubMed title
+    """
+    store.execute("INSERT OR IGNORE INTO pubmed_references VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                  list(data) + [reference_title, search_query, jaccard_score,
+                                datetime.now().isoformat(timespec='seconds')])
+    store.commit()
+
+
+def export_csv(db_path, csv_path, encoding='ISO-8859-15'):
+    """Writes the ASReview-compatible csv file from the reference store
+
+    Parameters
+    ----------
+    db_path : string
+        Path of the SQLite database
+
+    csv_path : string
+        Path of the csv file, which is overwritten
+
+    encoding : string
+        Encoding of the csv file. Characters it cannot represent are dropped,
+        the store itself keeps them.
+    """
+    store = sqlite3.connect(db_path)
+    try:
+        rows = store.execute("SELECT pubmed_id, title, abstract, doi, final_included "
+                             "FROM pubmed_references ORDER BY rowid").fetchall()
+    finally:
+        store.close()
+
+    with open(csv_path, 'w', newline='', encoding=encoding, errors='ignore') as csvfile:
+        cw = csv.writer(csvfile, delimiter=',')
+        cw.writerow(CSV_HEADER)
+        cw.writerows(rows)
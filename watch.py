@@ -0,0 +1,262 @@
+import argparse
+import os
+import threading
+import time
+
+# The extractor and processor modules are imported in the targets that use them,
+# so watching only one folder does not load the dependencies of the other tool.
+
+# Number of times a failing document is processed before it is left alone until it changes
+MAX_ATTEMPTS = 5
+
+
+def file_fingerprint(path):
+    # Same as record_cache.file_fingerprint, which cannot be imported here without loading pandas
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def is_locked(path):
+    # Word names its lock file "~$" + the filename without its first two characters,
+    # Excel uses "~$" + the full filename
+    directory, filename = os.path.split(path)
+    return any(os.path.exists(os.path.join(directory, '~$' + name))
+               for name in [filename, filename[2:]])
+
+
+def drd_target():
+    """Watches the DRDs folder and extracts the references of each new or changed DRD
+
+    Returns
+    -------
+    target : dictionary
+        directories : folders to watch
+        list_files : returns the current state of every document
+        needs_processing : whether a document found at startup still has to be processed
+        process : processes a single document
+    """
+    from RBA_to_ASReview import create_csv_path, setup_logging
+    from DRD_to_ASReview import getDRDs, process_DRD
+
+    setup_logging()
+
+    def list_files():
+        return {path: file_fingerprint(path) for path in getDRDs()}
+
+    def needs_processing(path):
+        # The csv is missing or older than the DRD it was extracted from
+        csv_fingerprint = file_fingerprint(create_csv_path(path))
+        return csv_fingerprint is None or csv_fingerprint[1] < file_fingerprint(path)[1]
+
+    return {
+        'name': 'DRD',
+        'directories': [os.path.join(os.getcwd(), 'DRDs')],
+        'list_files': list_files,
+        'needs_processing': needs_processing,
+        'process': process_DRD,
+    }
+
+
+def excel_target():
+    """Watches the ExcelFiles and ASReviewFiles folders and processes each new or changed
+    ASReview output. The config and the record cache of each workbook stay in memory;
+    they are read again when config.txt changes or the cache file was deleted.
+
+    Returns
+    -------
+    target : dictionary
+        See drd_target
+    """
+    from record_cache import load_cache, cache_path, count_failed_records
+    from process_asreview_output import (read_config, get_cache_settings, get_excels, get_asreview_path,
+                                         asreview_file_exists, process_excel_file)
+
+    def list_files():
+        # A changed .asreview file (new labels or notes) also means its workbook is processed again
+        return {path: (file_fingerprint(path), file_fingerprint(get_asreview_path(path)))
+                for path in get_excels()
+                if not path.endswith('_processed.xlsx') and asreview_file_exists(path)}
+
+    loaded = {'config': None, 'config_fingerprint': None}
+    caches = {}
+
+    def process(path):
+        config_fingerprint = file_fingerprint('config.txt')
+        if loaded['config'] is None or config_fingerprint != loaded['config_fingerprint']:
+            loaded['config'] = read_config()
+            loaded['config_fingerprint'] = config_fingerprint
+            caches.clear()
+
+        if path not in caches or not os.path.exists(cache_path(path)):
+            caches[path] = load_cache(path, get_cache_settings(loaded['config']))
+
+        process_excel_file(path, loaded['config'], caches[path])
+
+        # Let the watcher try again later for records whose full-text check failed
+        failed = count_failed_records(caches[path])
+        if failed > 0:
+            raise RuntimeError(f"the full-text check failed for {failed} records")
+
+    return {
+        'name': 'Excel',
+        'directories': [os.path.join(os.getcwd(), 'ExcelFiles'), os.path.join(os.getcwd(), 'ASReviewFiles')],
+        'list_files': list_files,
+        # Unchanged workbooks are skipped cheaply by process_excel_file
+        'needs_processing': lambda path: True,
+        'process': process,
+    }
+
+
+def start_observer(directories, wake):
+    """Starts a file system observer that sets the wake event on every change
+
+    Uses watchdog (inotify on Linux, ReadDirectoryChangesW on Windows) when it is
+    installed. Returns None otherwise, in which case the folders are polled.
+    """
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        return None
+
+    directories = [directory for directory in directories if os.path.isdir(directory)]
+    if not directories:
+        return None
+
+    class WakeHandler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            wake.set()
+
+    observer = Observer()
+    for directory in directories:
+        observer.schedule(WakeHandler(), directory, recursive=True)
+    observer.start()
+
+    return observer
+
+
+def watch(targets, interval=2.0, settle=2.0, retry=60.0):
+    """Processes new and modified documents of the targets as they land
+
+    A document is only processed once its size and modification time did not
+    change for `settle` seconds and no Office lock file exists for it, so
+    documents that are still being written or are open in Word/Excel are left
+    alone until they are saved and closed.
+
+    Parameters
+    ----------
+    targets : list of dictionaries
+        Targets as returned by drd_target and excel_target
+
+    interval : float
+        Seconds between scans when polling
+
+    settle : float
+        Seconds a document must stay unchanged before it is processed
+
+    retry : float
+        Seconds to wait before processing a document again after it failed. The wait
+        doubles with every failed attempt, and after MAX_ATTEMPTS attempts the document
+        is left alone until it changes.
+    """
+    wake = threading.Event()
+    observer = start_observer([d for target in targets for d in target['directories']], wake)
+    print(f"Watching for new documents using {'file system events' if observer else 'polling'}. "
+          f"Press Ctrl+C to stop.")
+
+    # Documents found at startup are only processed if their output is outdated
+    seen = {}
+    for target in targets:
+        seen[target['name']] = {path: state for path, state in target['list_files']().items()
+                                if not target['needs_processing'](path)}
+    pending = {target['name']: {} for target in targets}
+
+    try:
+        while True:
+            now = time.monotonic()
+
+            for target in targets:
+                target_seen = seen[target['name']]
+                target_pending = pending[target['name']]
+                current = target['list_files']()
+
+                for path, state in current.items():
+                    if target_seen.get(path) == state:
+                        continue
+
+                    # New or changed since the last scan, (re)start the settle timer
+                    if path not in target_pending or target_pending[path][0] != state:
+                        target_pending[path] = (state, now + settle, 0)
+                        continue
+
+                    if now < target_pending[path][1] or is_locked(path):
+                        continue
+
+                    print(f"Processing {target['name']} file '{path}'...")
+                    try:
+                        target['process'](path)
+                    except Exception as err:
+                        attempts = target_pending[path][2] + 1
+                        if attempts < MAX_ATTEMPTS:
+                            # Keep it pending, e.g. PubMed or WorldCat may be back later
+                            delay = retry * 2 ** (attempts - 1)
+                            print(f"!! Could not process '{path}', trying again in {delay:.0f} seconds: {err}")
+                            target_pending[path] = (state, time.monotonic() + delay, attempts)
+                            continue
+                        print(f"!! Could not process '{path}' after {attempts} attempts, "
+                              f"it is processed again once it changes: {err}")
+
+                    del target_pending[path]
+                    target_seen[path] = state
+
+                # Forget documents that were removed
+                for path in list(target_seen):
+                    if path not in current:
+                        del target_seen[path]
+                for path in list(target_pending):
+                    if path not in current:
+                        del target_pending[path]
+
+            # Without events, or while documents are settling, check again after a short while.
+            # The idle wait has a timeout too, so Ctrl+C is not blocked on Windows.
+            if observer is None or any(pending.values()):
+                wake.wait(interval if observer is None else settle)
+            else:
+                wake.wait(60)
+            wake.clear()
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch the DRDs and/or ExcelFiles folders "
+                                                 "and process documents as they are added or changed.")
+    parser.add_argument('folders', nargs='*', choices=['drds', 'excel'],
+                        help="folders to watch (default: both)")
+    parser.add_argument('--interval', type=float, default=2.0,
+                        help="seconds between scans when polling (default: 2)")
+    parser.add_argument('--settle', type=float, default=2.0,
+                        help="seconds a document must stay unchanged before it is processed (default: 2)")
+    parser.add_argument('--retry', type=float, default=60.0,
+                        help="seconds to wait before trying a failed document again (default: 60)")
+    args = parser.parse_args()
+
+    folders = args.folders or ['drds', 'excel']
+
+    targets = []
+    if 'drds' in folders:
+        targets.append(drd_target())
+    if 'excel' in folders:
+        targets.append(excel_target())
+
+    watch(targets, interval=args.interval, settle=args.settle, retry=args.retry)
+
+if __name__ == "__main__":
+    main()